@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 import asyncio
 import aiohttp
+import numpy as np
+import orjson
+import string
+import sys
 import time
-from typing import List
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from dataclasses import dataclass, replace
 from datetime import datetime
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import logging
+from rapidfuzz import fuzz, process
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -14,15 +19,35 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 MIN_SPREAD_PCT = 2.5
 POLL_INTERVAL = 10
+ORDERBOOK_CONCURRENCY = 20
+SCAN_INTERVAL = 1
+RECONNECT_DELAY = 5
+MAX_PAGE_AGE = 300
+PAGE_LOAD_TIMEOUT = 30
+CLOSE_TIMEOUT = 5
+MATCH_SCORE_CUTOFF = 90
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+ORDERBOOK_TIMEOUT = aiohttp.ClientTimeout(total=5)
+# Size of '{"bids": [], "asks": []}'; anything with a price level is larger
+EMPTY_ORDERBOOK_MAX_BYTES = 24
+
+_PUNCT = str.maketrans({c: ' ' for c in string.punctuation})
+
+def normalize_event_name(name: str) -> str:
+    # Punctuation is treated as whitespace so "NBA: Lakers" and "NBA Lakers" share a key
+    return " ".join(name.lower().translate(_PUNCT).split())[:100]
 
 @dataclass
 class MarketPrice:
+    # Explicit slots rather than slots=True keeps Python 3.8 support; normalized_key is derived in __post_init__
+    __slots__ = ('platform', 'event_id', 'event_name', 'outcome', 'bid', 'ask', 'timestamp', 'normalized_key')
     platform: str
     event_id: str
     event_name: str
@@ -31,6 +56,9 @@ class MarketPrice:
     ask: float
     timestamp: float
     
+    def __post_init__(self):
+        self.normalized_key = f"{normalize_event_name(self.event_name)}|{self.outcome}"
+    
     @property
     def mid(self) -> float:
         return (self.bid + self.ask) / 2 if self.bid and self.ask else 0.5
@@ -38,155 +66,420 @@ class MarketPrice:
 class PolymarketCollector:
     def __init__(self):
         self.api_url = "https://clob.polymarket.com"
+        self.ws_url = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+        self.session = None
+        self.prices: Dict[str, MarketPrice] = {}
+        self._market_cache = None
+        self._market_cache_ts = 0
+        self._market_ttl = 300
+        self._market_failures = 0
     
-    async def fetch_markets(self) -> List[MarketPrice]:
+    async def __aenter__(self):
+        self._get_session()
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.aclose()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit=64, limit_per_host=32, ttl_dns_cache=300, keepalive_timeout=30))
+        return self.session
+    
+    async def _fetch_orderbook(self, session, sem, market):
+        market_id = market.get("condition_id", "")
+        title = market.get("question", "")
+        if not market_id or not title: return None
+        try:
+            async with sem:
+                async with session.get(f"{self.api_url}/orderbooks/{market_id}", timeout=ORDERBOOK_TIMEOUT) as ob_resp:
+                    if ob_resp.status != 200: return None
+                    # A body this small can only be an empty book, so skip reading and parsing it
+                    if ob_resp.content_length is not None and ob_resp.content_length <= EMPTY_ORDERBOOK_MAX_BYTES:
+                        return None
+                    ob = await ob_resp.json(loads=orjson.loads)
+            bids = ob.get("bids", [])
+            asks = ob.get("asks", [])
+            if not bids or not asks: return None
+            bid = float(bids[0][0])
+            ask = float(asks[0][0])
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError, IndexError):
+            return None
+        return MarketPrice(
+            platform="Polymarket",
+            event_id=market_id,
+            event_name=title,
+            outcome="YES",
+            bid=bid,
+            ask=ask,
+            timestamp=time.time()
+        )
+    
+    async def _fetch_market_list(self, session) -> List[dict]:
+        # The top markets rarely change, so reuse them until the TTL expires
+        if self._market_cache and time.time() - self._market_cache_ts < self._market_ttl:
+            return self._market_cache
+        try:
+            async with session.get(f"{self.api_url}/markets", timeout=REQUEST_TIMEOUT) as resp:
+                if resp.status != 200:
+                    logger.error(f"Polymarket markets returned {resp.status}")
+                    return self._stale_market_list()
+                data = await resp.json(loads=orjson.loads)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Polymarket markets error: {e}")
+            return self._stale_market_list()
+        markets = data.get("markets", [])[:50]
+        if markets:
+            self._market_cache = markets
+            self._market_cache_ts = time.time()
+            self._market_failures = 0
+        return markets
+    
+    def _stale_market_list(self) -> List[dict]:
+        if not self._market_cache:
+            return []
+        # Keep serving the old list and back off the next refresh, so an outage does not turn
+        # every RECONNECT_DELAY into a resubscribe and a full orderbook reseed
+        self._market_failures += 1
+        retry_in = min(RECONNECT_DELAY * 2 ** self._market_failures, self._market_ttl)
+        self._market_cache_ts = time.time() - self._market_ttl + retry_in
+        return self._market_cache
+    
+    async def fetch_markets(self, markets: Optional[List[dict]] = None) -> List[MarketPrice]:
         prices = []
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/markets", timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        markets = data.get("markets", [])[:50]
-                        for market in markets:
-                            market_id = market.get("condition_id", "")
-                            title = market.get("question", "")
-                            if not market_id or not title: continue
-                            try:
-                                async with session.get(f"{self.api_url}/orderbooks/{market_id}", timeout=aiohttp.ClientTimeout(total=5)) as ob_resp:
-                                    if ob_resp.status == 200:
-                                        ob = await ob_resp.json()
-                                        bids = ob.get("bids", [])
-                                        asks = ob.get("asks", [])
-                                        if bids and asks:
-                                            prices.append(MarketPrice(
-                                                platform="Polymarket",
-                                                event_id=market_id,
-                                                event_name=title,
-                                                outcome="YES",
-                                                bid=float(bids[0][0]),
-                                                ask=float(asks[0][0]),
-                                                timestamp=time.time()
-                                            ))
-                            except: pass
+            session = self._get_session()
+            if markets is None:
+                markets = await self._fetch_market_list(session)
+            sem = asyncio.Semaphore(ORDERBOOK_CONCURRENCY)
+            tasks = [self._fetch_orderbook(session, sem, m) for m in markets]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            prices = [r for r in results if isinstance(r, MarketPrice)]
         except Exception as e:
             logger.error(f"Polymarket error: {e}")
         logger.info(f"Polymarket: {len(prices)} prices")
         return prices
+    
+    def _update_price(self, assets: Dict[str, dict], asset_id, bid, ask) -> bool:
+        market = assets.get(asset_id)
+        if market is None or bid is None or ask is None:
+            return False
+        try:
+            bid, ask = float(bid), float(ask)
+        except (TypeError, ValueError):
+            return False
+        market_id = market["condition_id"]
+        # An empty side has no tradable price, same as the REST path skipping books without bids or asks
+        if bid <= 0 or ask <= 0:
+            return self.prices.pop(market_id, None) is not None
+        self.prices[market_id] = MarketPrice(
+            platform="Polymarket",
+            event_id=market_id,
+            event_name=market["question"],
+            outcome="YES",
+            bid=bid,
+            ask=ask,
+            timestamp=time.time()
+        )
+        return True
+    
+    def _apply_ws_message(self, assets: Dict[str, dict], data: str) -> bool:
+        try:
+            events = orjson.loads(data)
+        except ValueError:
+            return False
+        if isinstance(events, dict):
+            events = [events]
+        changed = False
+        for event in events:
+            if not isinstance(event, dict): continue
+            kind = event.get("event_type")
+            try:
+                if kind == "book":
+                    bids = [float(level["price"]) for level in event.get("bids", [])]
+                    asks = [float(level["price"]) for level in event.get("asks", [])]
+                    changed |= self._update_price(
+                        assets, event.get("asset_id"), max(bids, default=0.0), min(asks, default=0.0))
+                elif kind == "price_change":
+                    for change in event.get("price_changes", []):
+                        changed |= self._update_price(
+                            assets, change.get("asset_id"), change.get("best_bid"), change.get("best_ask"))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+        return changed
+    
+    async def stream_markets(self, on_update: Callable[[], None]):
+        while True:
+            try:
+                session = self._get_session()
+                markets = [m for m in await self._fetch_market_list(session)
+                           if m.get("condition_id") and m.get("question")]
+                # The market channel is keyed by outcome token, so subscribe to each market's YES token
+                assets = {}
+                for market in markets:
+                    tokens = market.get("tokens") or []
+                    yes = next((t for t in tokens if str(t.get("outcome", "")).lower() == "yes"), None)
+                    if yes and yes.get("token_id"):
+                        assets[yes["token_id"]] = market
+                if not assets:
+                    logger.warning("Polymarket: no markets to subscribe to, retrying")
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    continue
+                # Only seed markets the socket will keep current
+                self.prices = {p.event_id: p for p in await self.fetch_markets(list(assets.values()))}
+                on_update()
+                # Resubscribe once the market list expires so resolved markets drop off and new ones join
+                deadline = max(self._market_cache_ts + self._market_ttl, time.time() + RECONNECT_DELAY)
+                async with session.ws_connect(self.ws_url, heartbeat=10) as ws:
+                    await ws.send_str(orjson.dumps({"assets_ids": list(assets), "type": "market"}).decode())
+                    logger.info(f"Polymarket: streaming {len(assets)} markets")
+                    while True:
+                        remaining = deadline - time.time()
+                        if remaining <= 0: break
+                        try:
+                            msg = await ws.receive(timeout=remaining)
+                        except asyncio.TimeoutError:
+                            break
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            if self._apply_ws_message(assets, msg.data):
+                                on_update()
+                        elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                                          aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+                if time.time() >= deadline:
+                    logger.info("Polymarket: market list expired, resubscribing")
+                    continue
+                logger.warning("Polymarket stream closed, reconnecting")
+            except Exception as e:
+                logger.error(f"Polymarket stream error: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+    
+    async def aclose(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+_CHROME_ARGS = ("--headless", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu")
+_CHROMEDRIVER_PATH = None
+
+def _chromedriver_path() -> str:
+    # ChromeDriverManager checks versions over the network, so resolve the path only once
+    global _CHROMEDRIVER_PATH
+    if _CHROMEDRIVER_PATH is None:
+        _CHROMEDRIVER_PATH = ChromeDriverManager().install()
+    return _CHROMEDRIVER_PATH
+
+def _build_options() -> Options:
+    chrome_options = Options()
+    for arg in _CHROME_ARGS:
+        chrome_options.add_argument(arg)
+    return chrome_options
+
+# Collects [event_name, price_text] for the first 50 market rows in a single WebDriver call
+_OPINION_ROWS_JS = r"""
+const rows = document.querySelectorAll('tr');
+const out = [];
+for (let i = 1; i < Math.min(rows.length, 51); i++) {
+    const tds = rows[i].querySelectorAll('td');
+    if (tds.length < 5) continue;
+    const name = tds[2].innerText.trim();
+    if (!name) continue;
+    // Titles on /macro often contain percentages, so only look at cells holding nothing but one
+    for (let j = 3; j < tds.length; j++) {
+        const m = tds[j].innerText.match(/^\s*([0-9]+[.,]?[0-9]*)%\s*$/);
+        if (m) { out.push([name, m[1]]); break; }
+    }
+}
+return [rows.length, out];
+"""
 
 class OPINIONCollector:
     def __init__(self):
         self.base_url = "https://app.opinion.trade"
         self.driver = None
+        self.prices: List[MarketPrice] = []
+        self._loaded = False
+        self._loaded_at = 0.0
+        # The WebDriver is not thread-safe, so every Selenium call goes through one worker
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="opinion-selenium")
     
     def _init_driver(self):
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+            self.driver = webdriver.Chrome(service=Service(_chromedriver_path()), options=_build_options())
+            # Keeps a hung navigation from holding the Selenium worker for the 300 s default
+            self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
             logger.info("Chrome driver initialized")
             return True
         except Exception as e:
             logger.error(f"Chrome error: {e}")
             return False
     
+    def _make_price(self, event_name: str, mid_price: float) -> MarketPrice:
+        return MarketPrice(
+            platform="OPINION",
+            event_id=event_name,
+            event_name=event_name,
+            outcome="YES",
+            bid=mid_price * 0.99,
+            ask=mid_price * 1.01,
+            timestamp=time.time()
+        )
+    
+    def _load_page(self, navigate: bool):
+        if navigate:
+            logger.info("Loading OPINION...")
+            self.driver.get(f"{self.base_url}/macro")
+        else:
+            logger.info("Refreshing OPINION...")
+            self.driver.refresh()
+        WebDriverWait(self.driver, 15).until(EC.presence_of_all_elements_located((By.TAG_NAME, "tr")))
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+    
     def _fetch_selenium(self) -> List[MarketPrice]:
         prices = []
         if not self.driver and not self._init_driver():
             return prices
         try:
-            logger.info("Loading OPINION...")
-            self.driver.get(f"{self.base_url}/macro")
-            WebDriverWait(self.driver, 15).until(EC.presence_of_all_elements_located((By.TAG_NAME, "tr")))
-            rows = self.driver.find_elements(By.TAG_NAME, "tr")
-            logger.info(f"Found {len(rows)} rows")
-            for row in rows[1:51]:
+            # The SPA keeps prices live after the first load, so only navigate once and
+            # refresh when the page gets old or the table renders empty
+            if not self._loaded:
+                self._load_page(navigate=True)
+            elif time.monotonic() - self._loaded_at > MAX_PAGE_AGE:
+                self._load_page(navigate=False)
+            row_count, rows = self.driver.execute_script(_OPINION_ROWS_JS)
+            if not rows:
+                logger.warning("OPINION table empty, refreshing")
+                self._load_page(navigate=False)
+                row_count, rows = self.driver.execute_script(_OPINION_ROWS_JS)
+            logger.info(f"Found {row_count} rows")
+            for event_name, price_text in rows:
                 try:
-                    cols = row.find_elements(By.TAG_NAME, "td")
-                    if len(cols) < 5: continue
-                    event_name = cols[2].text.strip()
-                    if not event_name: continue
-                    price_elements = row.find_elements(By.XPATH, ".//*[contains(text(), '%')]")
-                    if len(price_elements) >= 1:
-                        try:
-                            price_text = price_elements[0].text.strip()
-                            price_value = float(price_text.replace('%', '').replace(',', '.'))
-                            if 0 < price_value < 100:
-                                mid_price = price_value / 100.0
-                                prices.append(MarketPrice(
-                                    platform="OPINION",
-                                    event_id=event_name,
-                                    event_name=event_name,
-                                    outcome="YES",
-                                    bid=mid_price * 0.99,
-                                    ask=mid_price * 1.01,
-                                    timestamp=time.time()
-                                ))
-                        except: pass
-                except: continue
+                    price_value = float(price_text.replace(',', '.'))
+                    if 0 < price_value < 100:
+                        prices.append(self._make_price(event_name, price_value / 100.0))
+                except (AttributeError, ValueError):
+                    continue
             logger.info(f"OPINION: {len(prices)} prices")
         except Exception as e:
             logger.error(f"OPINION error: {e}")
+            self._loaded = False
         return prices
     
     async def fetch_markets(self) -> List[MarketPrice]:
-        loop = asyncio.get_event_loop()
-        prices = await loop.run_in_executor(None, self._fetch_selenium)
+        loop = asyncio.get_running_loop()
+        prices = await loop.run_in_executor(self._executor, self._fetch_selenium)
         return prices
     
-    def close(self):
+    async def poll_markets(self, on_update: Callable[[], None]):
+        while True:
+            try:
+                self.prices = await self.fetch_markets()
+                on_update()
+            except Exception as e:
+                logger.error(f"OPINION error: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+    
+    def _quit_driver(self):
         if self.driver:
             try:
                 self.driver.quit()
                 logger.info("Chrome closed")
-            except: pass
+            except WebDriverException as e:
+                logger.error(f"Chrome close error: {e}")
+            self.driver = None
+    
+    def close(self):
+        # Quit on the Selenium worker so it cannot race a scrape that is still running, but
+        # don't let a stuck scrape hold up shutdown; quitting from here then ends that scrape too
+        future = self._executor.submit(self._quit_driver)
+        try:
+            future.result(timeout=CLOSE_TIMEOUT)
+        except FutureTimeoutError:
+            logger.warning("Selenium worker busy, closing Chrome directly")
+            future.cancel()
+            self._quit_driver()
+        self._executor.shutdown(wait=False)
 
 class ArbitrageEngine:
-    def __init__(self, min_spread: float = 2.5):
+    def __init__(self, min_spread: float = 2.5, match_cutoff: float = MATCH_SCORE_CUTOFF):
         self.min_spread = min_spread
         self.fee_pct = 1.0
+        self.match_cutoff = match_cutoff
     
-    def normalize_event_name(self, name: str) -> str:
-        return " ".join(name.lower().split())[:100]
+    def align_events(self, reference: List[MarketPrice], others: List[MarketPrice]) -> List[MarketPrice]:
+        # Titles differ in word order across platforms, so rename prices in `others` to their fuzzy
+        # match in `reference` and let process_prices group them. token_sort_ratio compares whole
+        # titles, so "Trump" does not match "Will Trump win the 2024 election?" the way a subset
+        # scorer would, and matches are one-to-one so paired prices never collapse onto one key.
+        if not reference or not others:
+            return others
+        scores = process.cdist(
+            [p.event_name for p in reference], [p.event_name for p in others],
+            scorer=fuzz.token_sort_ratio, processor=normalize_event_name, score_cutoff=self.match_cutoff)
+        ii, jj = np.nonzero(scores >= self.match_cutoff)
+        order = np.argsort(-scores[ii, jj], kind="stable")
+        claimed_ref, claimed_other = set(), set()
+        aligned = list(others)
+        for i, j in zip(ii[order], jj[order]):
+            if i in claimed_ref or j in claimed_other or reference[i].outcome != others[j].outcome:
+                continue
+            claimed_ref.add(i)
+            claimed_other.add(j)
+            aligned[j] = replace(others[j], event_name=reference[i].event_name)
+        return aligned
     
     def process_prices(self, prices: List[MarketPrice]):
         opportunities = []
-        grouped = defaultdict(list)
+        grouped: Dict[str, Dict[str, MarketPrice]] = {}
         for price in prices:
-            key = f"{self.normalize_event_name(price.event_name)}|{price.outcome}"
-            grouped[key].append(price)
+            platforms = grouped.setdefault(price.normalized_key, {})
+            current = platforms.get(price.platform)
+            if current is None or price.timestamp >= current.timestamp:
+                platforms[price.platform] = price
         
-        for event_key, event_prices in grouped.items():
-            if len(event_prices) < 2: continue
-            platforms = {p.platform: p for p in event_prices}
-            if len(platforms) < 2: continue
-            
-            platform_list = list(platforms.items())
-            for i in range(len(platform_list)):
-                for j in range(i + 1, len(platform_list)):
-                    p1_name, p1 = platform_list[i]
-                    p2_name, p2 = platform_list[j]
-                    price1 = p1.mid
-                    price2 = p2.mid
-                    if price1 > price2:
-                        price1, price2 = price2, price1
-                        p1_name, p2_name = p2_name, p1_name
-                    spread = ((price2 - price1) / price1) * 100
-                    net_spread = spread - (2 * self.fee_pct)
-                    if net_spread >= self.min_spread:
-                        event_name, outcome = event_key.split("|")
-                        opportunities.append({
-                            'event': event_name,
-                            'buy_platform': p1_name,
-                            'buy_price': price1,
-                            'sell_platform': p2_name,
-                            'sell_price': price2,
-                            'net_spread': net_spread
-                        })
+        # Most events are listed on only one platform; drop them before any pair work
+        candidates = [(key, plats) for key, plats in grouped.items() if len(plats) >= 2]
+        for event_key, platforms in candidates:
+            names = list(platforms)
+            mids = np.array([p.mid for p in platforms.values()], dtype=np.float64)
+            buy, sell = mids[:, None], mids[None, :]
+            # spread[i, j]: buy on platform i, sell on platform j; each pair is counted once, cheaper side first
+            spread = (sell - buy) / buy * 100 - 2 * self.fee_pct
+            ordered = (sell > buy) | np.triu(sell == buy, 1)
+            event_name, outcome = event_key.split("|")
+            for i, j in zip(*np.where((spread >= self.min_spread) & ordered)):
+                opportunities.append({
+                    'event': event_name,
+                    'buy_platform': names[i],
+                    'buy_price': float(mids[i]),
+                    'sell_platform': names[j],
+                    'sell_price': float(mids[j]),
+                    'net_spread': float(spread[i, j])
+                })
         return opportunities
 
+def _write_lines(lines: List[str]):
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+async def _printer(q: asyncio.Queue):
+    # Scan output is queued and written from a worker thread so a slow terminal cannot stall the event loop
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            lines = [await q.get()]
+            while not q.empty():
+                lines.append(q.get_nowait())
+            await loop.run_in_executor(None, _write_lines, lines)
+    finally:
+        lines = []
+        while not q.empty():
+            lines.append(q.get_nowait())
+        if lines:
+            _write_lines(lines)
+
 async def main():
     print("\n" + "="*60)
     print("🚀 ARBITRAGE BOT - Polymarket vs OPINION")
@@ -199,43 +492,60 @@ async def main():
     iteration = 0
     found_total = 0
     
+    # Polymarket pushes orderbook deltas and OPINION polls; either one wakes the scan loop
+    updated = asyncio.Event()
+    print_q = asyncio.Queue()
+    feeds = [
+        asyncio.create_task(polymarket.stream_markets(updated.set)),
+        asyncio.create_task(opinion.poll_markets(updated.set)),
+        asyncio.create_task(_printer(print_q)),
+    ]
+    
     try:
         while True:
             try:
+                await updated.wait()
+                updated.clear()
                 iteration += 1
                 timestamp = datetime.now().strftime("%H:%M:%S")
-                print(f"\n[Scan #{iteration}] {timestamp}")
+                print_q.put_nowait(f"\n[Scan #{iteration}] {timestamp}")
                 
-                all_prices = []
-                pm_prices = await polymarket.fetch_markets()
-                all_prices.extend(pm_prices)
-                op_prices = await opinion.fetch_markets()
-                all_prices.extend(op_prices)
+                pm_prices = list(polymarket.prices.values())
+                op_prices = opinion.prices
+                all_prices = pm_prices + engine.align_events(pm_prices, op_prices)
                 
-                print(f"Total prices: {len(all_prices)} (PM: {len(pm_prices)}, OPINION: {len(op_prices)})")
+                print_q.put_nowait(f"Total prices: {len(all_prices)} (PM: {len(pm_prices)}, OPINION: {len(op_prices)})")
                 
                 opportunities = engine.process_prices(all_prices)
                 
                 if opportunities:
                     found_total += len(opportunities)
-                    print(f"\n✅ FOUND {len(opportunities)} OPPORTUNITIES!\n")
+                    print_q.put_nowait(f"\n✅ FOUND {len(opportunities)} OPPORTUNITIES!\n")
                     for idx, opp in enumerate(opportunities, 1):
-                        print(f"  {idx}. {opp['event']}")
-                        print(f"     BUY  {opp['buy_platform']:12} @ {opp['buy_price']:.6f}")
-                        print(f"     SELL {opp['sell_platform']:12} @ {opp['sell_price']:.6f}")
-                        print(f"     SPREAD: {opp['net_spread']:.3f}%\n")
+                        print_q.put_nowait(f"  {idx}. {opp['event']}")
+                        print_q.put_nowait(f"     BUY  {opp['buy_platform']:12} @ {opp['buy_price']:.6f}")
+                        print_q.put_nowait(f"     SELL {opp['sell_platform']:12} @ {opp['sell_price']:.6f}")
+                        print_q.put_nowait(f"     SPREAD: {opp['net_spread']:.3f}%\n")
                 else:
-                    print("No opportunities found")
+                    print_q.put_nowait("No opportunities found")
                 
-                print(f"Total found: {found_total}")
-                await asyncio.sleep(POLL_INTERVAL)
+                print_q.put_nowait(f"Total found: {found_total}")
+                # Coalesce bursts of deltas into at most one scan per SCAN_INTERVAL
+                await asyncio.sleep(SCAN_INTERVAL)
             except Exception as e:
                 logger.error(f"Error: {e}")
                 await asyncio.sleep(10)
     finally:
+        for feed in feeds:
+            feed.cancel()
+        await asyncio.gather(*feeds, return_exceptions=True)
+        await polymarket.aclose()
         opinion.close()
 
 if __name__ == "__main__":
+    if sys.platform != "win32":
+        import uvloop
+        uvloop.install()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import aiohttp
+import orjson
+
+from bot import RECONNECT_DELAY, ArbitrageEngine, MarketPrice, PolymarketCollector
+
+
+def _price(platform, name, mid):
+    return MarketPrice(platform, name, name, "YES", mid, mid, time.time())
+
+
+def test_align_events_pairs_reordered_titles():
+    engine = ArbitrageEngine()
+    pm = [_price("Polymarket", "2024 US Presidential Election", 0.40)]
+    op = [_price("OPINION", "US Presidential Election 2024", 0.50)]
+    aligned = engine.align_events(pm, op)
+    assert aligned[0].event_name == "2024 US Presidential Election"
+    assert len(engine.process_prices(pm + aligned)) == 1
+
+
+def test_align_events_ignores_subset_titles():
+    engine = ArbitrageEngine()
+    pm = [_price("Polymarket", "Will Trump win the 2024 election?", 0.30)]
+    op = [_price("OPINION", "Will Trump win?", 0.50), _price("OPINION", "Trump", 0.50)]
+    aligned = engine.align_events(pm, op)
+    assert [p.event_name for p in aligned] == ["Will Trump win?", "Trump"]
+    assert engine.process_prices(pm + aligned) == []
+
+
+def test_align_events_matches_each_reference_title_once():
+    engine = ArbitrageEngine()
+    pm = [_price("Polymarket", "Will Bitcoin reach 100k in 2025?", 0.40)]
+    op = [
+        _price("OPINION", "Will Bitcoin reach 100k by 2025", 0.50),
+        _price("OPINION", "Will Bitcoin reach 100k in 2025", 0.60),
+    ]
+    aligned = engine.align_events(pm, op)
+    assert [p.event_name for p in aligned] == ["Will Bitcoin reach 100k by 2025", pm[0].event_name]
+
+
+ASSETS = {"yes-token": {"condition_id": "cond-1", "question": "Will it rain?"}}
+
+
+def _ws(*events):
+    return orjson.dumps(list(events)).decode()
+
+
+def test_apply_ws_message_book_uses_best_levels():
+    collector = PolymarketCollector()
+    book = {
+        "event_type": "book",
+        "asset_id": "yes-token",
+        "bids": [{"price": "0.40", "size": "5"}, {"price": "0.45", "size": "1"}],
+        "asks": [{"price": "0.55", "size": "2"}, {"price": "0.50", "size": "3"}],
+    }
+    assert collector._apply_ws_message(ASSETS, _ws(book))
+    price = collector.prices["cond-1"]
+    assert (price.bid, price.ask, price.event_name) == (0.45, 0.50, "Will it rain?")
+
+
+def test_apply_ws_message_price_change_updates_best_bid_ask():
+    collector = PolymarketCollector()
+    change = {"event_type": "price_change",
+              "price_changes": [{"asset_id": "yes-token", "best_bid": "0.41", "best_ask": "0.62"}]}
+    assert collector._apply_ws_message(ASSETS, _ws(change))
+    assert (collector.prices["cond-1"].bid, collector.prices["cond-1"].ask) == (0.41, 0.62)
+
+
+def test_apply_ws_message_empty_side_drops_price():
+    collector = PolymarketCollector()
+    change = {"event_type": "price_change",
+              "price_changes": [{"asset_id": "yes-token", "best_bid": "0.41", "best_ask": "0.62"}]}
+    collector._apply_ws_message(ASSETS, _ws(change))
+    zero_bid = {"event_type": "price_change",
+                "price_changes": [{"asset_id": "yes-token", "best_bid": "0", "best_ask": "0.62"}]}
+    assert collector._apply_ws_message(ASSETS, _ws(zero_bid))
+    assert "cond-1" not in collector.prices
+
+    collector._apply_ws_message(ASSETS, _ws(change))
+    one_sided = {"event_type": "book", "asset_id": "yes-token",
+                 "bids": [{"price": "0.40", "size": "5"}], "asks": []}
+    assert collector._apply_ws_message(ASSETS, _ws(one_sided))
+    assert "cond-1" not in collector.prices
+
+
+def test_apply_ws_message_ignores_unknown_asset():
+    collector = PolymarketCollector()
+    change = {"event_type": "price_change",
+              "price_changes": [{"asset_id": "other-token", "best_bid": "0.41", "best_ask": "0.62"}]}
+    assert not collector._apply_ws_message(ASSETS, _ws(change))
+    assert collector.prices == {}
+
+
+class _FailingSession:
+    def get(self, *args, **kwargs):
+        raise aiohttp.ClientConnectionError("offline")
+
+
+def test_market_list_failure_backs_off_refresh():
+    collector = PolymarketCollector()
+    cached = [{"condition_id": "cond-1", "question": "Will it rain?"}]
+    collector._market_cache = cached
+    delays = []
+    for _ in range(3):
+        collector._market_cache_ts = time.time() - collector._market_ttl - 1
+        assert asyncio.run(collector._fetch_market_list(_FailingSession())) == cached
+        delays.append(collector._market_cache_ts + collector._market_ttl - time.time())
+    assert delays[0] > RECONNECT_DELAY and delays[0] < delays[1] < delays[2] <= collector._market_ttl